@@ -1,12 +1,25 @@
 """Configuration management for Azure CLI MCP Server."""
 
 import json
+import operator
 import os
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set
 
-from pydantic import Field, computed_field, field_validator
+from pydantic import Field, PrivateAttr, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Fetches the fields required for service principal authentication in one call
+_credentials_getter = operator.attrgetter(
+    "azure_tenant_id", "azure_client_id", "azure_client_secret"
+)
+
+# Log levels accepted by the log_level setting
+_VALID_LOG_LEVELS = frozenset({"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"})
+
+# Fields left out of safe_dump(), built once and passed as model_dump's exclude
+_SECRET_FIELDS_EXCLUDE: Set[str] = {"azure_client_secret"}
+
 
 class Settings(BaseSettings):
     """Application settings using Pydantic."""
@@ -50,45 +63,59 @@ class Settings(BaseSettings):
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     log_file: str = Field(default="azure_cli_mcp.log", alias="LOG_FILE")
 
+    # Derived credential values, computed once since settings are immutable
+    _azure_credentials: Optional[Dict[str, Optional[str]]] = PrivateAttr(default=None)
+    _azure_credentials_json: Optional[str] = PrivateAttr(default=None)
+
     @field_validator("log_level")
     @classmethod
     def validate_log_level(cls, v: str) -> str:
         """Validate log level."""
-        valid_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-        if v.upper() not in valid_levels:
-            return "INFO"  # Default to INFO for invalid values
-        return v.upper()
+        level = v.upper()
+        # Default to INFO for invalid values
+        return level if level in _VALID_LOG_LEVELS else "INFO"
+
+    def model_post_init(self, __context: Any) -> None:
+        """Precompute derived credential values."""
+        tenant_id, client_id, client_secret = _credentials_getter(self)
+        if tenant_id and client_id and client_secret:
+            self._azure_credentials = {
+                "tenant_id": tenant_id,
+                "client_id": client_id,
+                "client_secret": client_secret,
+            }
+            credentials = {
+                "tenantId": tenant_id,
+                "clientId": client_id,
+                "clientSecret": client_secret,
+            }
+            if self.azure_subscription_id:
+                credentials["subscriptionId"] = self.azure_subscription_id
+            self._azure_credentials_json = json.dumps(credentials)
 
-    @computed_field
+    @property
     def azure_credentials(self) -> Optional[Dict[str, Optional[str]]]:
         """Get Azure credentials as a dictionary."""
-        if self.has_azure_credentials():
-            return {
-                "tenant_id": self.azure_tenant_id,
-                "client_id": self.azure_client_id,
-                "client_secret": self.azure_client_secret,
-            }
-        return None
+        return self._azure_credentials
 
     def has_azure_credentials(self) -> bool:
         """Check if all required Azure credentials are present."""
-        return all(
-            [self.azure_tenant_id, self.azure_client_id, self.azure_client_secret]
-        )
+        return self._azure_credentials is not None
 
     def get_azure_credentials_json(self) -> Optional[str]:
         """Get Azure credentials as JSON string for Azure CLI authentication."""
-        if self.has_azure_credentials():
-            credentials = {
-                "tenantId": self.azure_tenant_id,
-                "clientId": self.azure_client_id,
-                "clientSecret": self.azure_client_secret,
-            }
-            if self.azure_subscription_id:
-                credentials["subscriptionId"] = self.azure_subscription_id
-            return json.dumps(credentials)
-        return None
+        return self._azure_credentials_json
+
+    def safe_dump(self) -> Dict[str, Any]:
+        """Dump settings as a dictionary with secret fields excluded."""
+        return self.model_dump(exclude=_SECRET_FIELDS_EXCLUDE)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Get the process-wide settings, parsed from the environment once."""
+    return Settings()
 
 
 # Global settings instance
-settings = Settings()
+settings = get_settings()
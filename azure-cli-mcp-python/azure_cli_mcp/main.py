@@ -2,6 +2,7 @@
 
 import asyncio
 import logging
+import os
 import sys
 from typing import Any, Dict, List, Optional, Union
 
@@ -12,19 +13,33 @@ from mcp.types import (
     Tool,
 )
 
-from azure_cli_mcp.config import Settings
+from azure_cli_mcp.config import Settings, get_settings
 from azure_cli_mcp.services.azure_cli_service import AzureCliService
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 # Global service instance
 azure_cli_service: Optional[AzureCliService] = None
 
 
+def _configure_logging(settings: Settings) -> None:
+    """Configure root logging handlers once for the whole process."""
+    # Ensure log directory exists
+    log_dir = os.path.dirname(settings.log_file)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            # Don't open the log file until the first record is written
+            logging.FileHandler(settings.log_file, delay=True),
+            logging.StreamHandler(),
+        ],
+    )
+
+
 def create_azure_cli_tool() -> Tool:
     """Create the Azure CLI command execution tool definition."""
     return Tool(
@@ -51,30 +66,37 @@ def create_azure_cli_tool() -> Tool:
     )
 
 
+# Tool definition is static, so it is built once and shared
+AZURE_CLI_TOOL = create_azure_cli_tool()
+_TOOLS_LIST: List[Tool] = [AZURE_CLI_TOOL]
 
-
-
+# Fixed error responses, shared across tool calls
+_ERR_NOT_INIT = TextContent(
+    type="text", text="Error: Azure CLI service not initialized"
+)
+_ERR_MISSING_CMD = TextContent(type="text", text="Error: Missing command argument")
+_ERR_NOT_STRING = TextContent(type="text", text="Error: Command must be a string")
 
 
 async def main() -> None:
     """Main MCP server entry point."""
     global azure_cli_service
 
+    settings = get_settings()
+
     try:
-        # Initialize settings and service
-        settings = Settings()
+        _configure_logging(settings)
+
+        # Initialize service
         azure_cli_service = AzureCliService(settings)
 
         # Create MCP server
         server: Server = Server("azure-cli-mcp")
 
-        # Register tools
-        azure_cli_tool = create_azure_cli_tool()
-
         @server.list_tools()  # type: ignore
         async def handle_list_tools() -> List[Tool]:
             """List available tools."""
-            return [azure_cli_tool]
+            return _TOOLS_LIST
 
         @server.call_tool()  # type: ignore
         async def handle_call_tool(
@@ -85,19 +107,17 @@ async def main() -> None:
                 try:
                     # Check if service is initialized
                     if not azure_cli_service:
-                        return [TextContent(type="text", text="Error: Azure CLI service not initialized")]
+                        return [_ERR_NOT_INIT]
 
                     # Validate arguments
                     if not arguments or "command" not in arguments:
-                        return [TextContent(type="text", text="Error: Missing command argument")]
+                        return [_ERR_MISSING_CMD]
 
                     command = arguments["command"]
                     if not isinstance(command, str):
-                        return [TextContent(type="text", text="Error: Command must be a string")]
-
-                    logger.info(f"Executing Azure CLI command via MCP: {command}")
+                        return [_ERR_NOT_STRING]
 
-                    # Execute the Azure CLI command
+                    # Execute the Azure CLI command (the service logs it redacted)
                     result = await azure_cli_service.execute_azure_cli(command)
                     return [TextContent(type="text", text=result)]
 
@@ -108,16 +128,19 @@ async def main() -> None:
                 return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
         logger.info("Starting Azure CLI MCP Server...")
-        logger.info(f"Available tools: {azure_cli_tool.name}")
+        logger.info(f"Available tools: {AZURE_CLI_TOOL.name}")
         logger.info(f"Log level: {settings.log_level}")
         logger.info(f"Log file: {settings.log_file}")
 
+        # Initialization options don't change, so compute them once up front
+        init_options = server.create_initialization_options()
+
         # Run the server with stdio transport
         async with stdio_server() as streams:
             await server.run(
                 streams[0],  # read stream
                 streams[1],  # write stream
-                server.create_initialization_options(),
+                init_options,
             )
 
     except KeyboardInterrupt:
@@ -1,15 +1,37 @@
 """Azure CLI Service for executing Azure CLI commands."""
 
 import asyncio
+import contextlib
 import json
 import logging
-import os
 import re
-import subprocess
+import shlex
+import shutil
 from typing import Optional
 
 from azure_cli_mcp.config import Settings
 from azure_cli_mcp.services.azure_login_handler import AzureLoginHandler
+from azure_cli_mcp.services.limits import STREAM_LIMIT
+from azure_cli_mcp.services.redaction import SecretRedactor
+
+# Characters rejected by command validation: shell metacharacters, ASCII
+# control characters (NUL, tab, CR/LF, ANSI escapes), DEL and C1 controls
+# (NEL, 8-bit CSI) and Unicode line breaks
+_INVALID_CHARS_RE = re.compile(r"[;&|`$()<>\x00-\x1f\x7f-\x9f\u2028\u2029]")
+
+
+def validate_command(command: str) -> Optional[str]:
+    """Validate Azure CLI command and return it stripped, or None if invalid."""
+    if not command:
+        return None
+
+    command = command.strip()
+
+    # Must start with 'az' and contain no command injection characters
+    if not command.startswith("az ") or _INVALID_CHARS_RE.search(command):
+        return None
+
+    return command
 
 
 class AzureCliService:
@@ -18,27 +40,19 @@ class AzureCliService:
     def __init__(self, settings: Settings):
         """Initialize Azure CLI service."""
         self.settings = settings
-        self.login_handler = AzureLoginHandler()
-
-        # Set up logger
-        self.logger = logging.getLogger(__name__)
-
-        # Configure logging
-        log_level = getattr(logging, settings.log_level.upper())
-
-        # Ensure log directory exists
-        log_dir = os.path.dirname(settings.log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True)
-
-        logging.basicConfig(
-            level=log_level,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[logging.FileHandler(settings.log_file), logging.StreamHandler()],
+        # Resolve the az executable once instead of searching PATH per command
+        self._az_path = shutil.which("az") or "az"
+        self.login_handler = AzureLoginHandler(
+            settings.azure_client_secret, self._az_path
         )
+        # Bound the number of az subprocesses running at once
+        self._semaphore = asyncio.Semaphore(settings.max_concurrent_commands)
+        # Keep credentials out of logged commands and output
+        self._redactor = SecretRedactor([settings.azure_client_secret])
 
-        # Set the logger level for this specific logger
-        self.logger.setLevel(log_level)
+        # Set up logger (handlers are configured once by the application)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(getattr(logging, settings.log_level.upper()))
 
         self.logger.info("AzureCliService initialized")
 
@@ -50,59 +64,27 @@ class AzureCliService:
 
     async def execute_azure_cli(self, command: str) -> str:
         """Execute Azure CLI command with validation and error handling."""
-        self.logger.info(f"Executing Azure CLI command: {command}")
+        self.logger.info(
+            "Executing Azure CLI command: %s", self._redactor.redact(command)
+        )
 
-        # Validate command
-        if not self._validate_command(command):
-            self.logger.error(f"Invalid command: {command}")
+        # Validate and normalize command
+        prepared_command = validate_command(command)
+        if prepared_command is None:
+            self.logger.error("Invalid command: %s", self._redactor.redact(command))
             return "Error: Invalid command. Command must start with 'az'."
 
-        # Sanitize command
-        sanitized_command = self._sanitize_command(command)
-
         try:
-            output = await self._run_azure_cli_command(sanitized_command)
-            self.logger.info(f"Azure CLI command output: {output}")
+            output = await self._run_azure_cli_command(prepared_command)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    "Azure CLI command output: %s", self._redactor.redact(output)
+                )
             return output
         except Exception as e:
             self.logger.error(f"Error executing Azure CLI command: {e}")
             return f"Error: Command execution failed - {str(e)}"
 
-    def _validate_command(self, command: str) -> bool:
-        """Validate Azure CLI command."""
-        if not command or not command.strip():
-            return False
-
-        command = command.strip()
-
-        # Must start with 'az'
-        if not command.startswith("az "):
-            return False
-
-        # Check for command injection attempts
-        dangerous_chars = [";", "&", "|", "`", "$", "(", ")", "<", ">", "\n", "\r"]
-        if any(char in command for char in dangerous_chars):
-            return False
-
-        return True
-
-    def _sanitize_command(self, command: str) -> str:
-        """Sanitize Azure CLI command."""
-        # Basic sanitization - remove dangerous characters
-        command = command.strip()
-
-        # Remove potential command injection characters
-        dangerous_patterns = [
-            r"[;&|`$<>\n\r]",  # Shell metacharacters
-            r"\|\|",  # OR operator
-            r"&&",  # AND operator
-        ]
-
-        for pattern in dangerous_patterns:
-            command = re.sub(pattern, "", command)
-
-        return command
-
     async def _authenticate(self, azure_credentials: str) -> Optional[str]:
         """Authenticate using service principal credentials."""
         try:
@@ -125,7 +107,9 @@ class AzureCliService:
             )
 
             result = await self._run_azure_cli_command(login_command)
-            self.logger.info(f"Azure CLI login result: {result}")
+            self.logger.info(
+                "Azure CLI login result: %s", self._redactor.redact(result)
+            )
             return result
 
         except json.JSONDecodeError as e:
@@ -140,19 +124,46 @@ class AzureCliService:
         if command.startswith("az login"):
             return await self.login_handler.handle_az_login_command(command)
 
-        self.logger.info(f"Running Azure CLI command: {command}")
+        self.logger.info(
+            "Running Azure CLI command: %s", self._redactor.redact(command)
+        )
 
         try:
-            # Create subprocess for command execution
-            # Use shell=True for Windows compatibility
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,  # Separate stderr for proper handling
-                shell=True,
-            )
+            if self._semaphore.locked():
+                self.logger.info(
+                    "Concurrent command limit reached, command queued: %s",
+                    self._redactor.redact(command),
+                )
+
+            async with self._semaphore:
+                # Execute az directly rather than through an intermediate shell
+                argv = shlex.split(command)
+                argv[0] = self._az_path
+                process = await asyncio.create_subprocess_exec(
+                    *argv,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,  # Separate stderr for handling
+                    limit=STREAM_LIMIT,
+                )
 
-            stdout, stderr = await process.communicate()
+                try:
+                    stdout, stderr = await asyncio.wait_for(
+                        process.communicate(), timeout=self.settings.command_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.logger.error(
+                        "Azure CLI command timed out after %s seconds: %s",
+                        self.settings.command_timeout,
+                        self._redactor.redact(command),
+                    )
+                    # The process may have exited between the timeout and kill
+                    with contextlib.suppress(ProcessLookupError):
+                        process.kill()
+                    await process.wait()
+                    return (
+                        "Error: Command timed out after "
+                        f"{self.settings.command_timeout} seconds"
+                    )
 
             stdout_text = stdout.decode("utf-8") if stdout else ""
             stderr_text = stderr.decode("utf-8") if stderr else ""
@@ -1,59 +1,124 @@
 """Azure Login Handler for device code authentication."""
 
 import asyncio
+import contextlib
 import logging
 import os
 import re
-from typing import List, Optional
+import shlex
+from typing import List, Optional, Set
+
+from azure_cli_mcp.services.limits import STREAM_LIMIT
+from azure_cli_mcp.services.redaction import SecretRedactor
+
+# Authentication flags that conflict with the forced device code flow
+_STRIPPED_LOGIN_FLAGS = frozenset({"--use-device-code", "--service-principal"})
+
+# Authentication options that conflict with device code flow, with their values
+_STRIPPED_LOGIN_OPTIONS = frozenset({"--username", "-u", "--password", "-p"})
+
+# Device code login URL or user code in raw az login output
+_DEVICE_CODE_SIGNAL_RE = re.compile(rb"https://\S+|\b[A-Z0-9]{8,}\b")
+
+# Keywords marking lines of the device code prompt
+_DEVICE_CODE_RE = re.compile(
+    r"device|code|browser|authenticate|https://|to sign in|microsoft\.com",
+    re.IGNORECASE,
+)
+
+# Maximum number of bytes requested per read of the login output
+_READ_CHUNK_SIZE = 4096
+
+# Maximum number of bytes requested per read when draining a stream to EOF
+_DRAIN_CHUNK_SIZE = 65536
+
+# Seconds to wait for a cancelled login process to exit before killing it
+_TERMINATE_TIMEOUT = 2.0
+
+# Seconds to wait for the device code prompt before giving up
+_DEVICE_CODE_TIMEOUT = 30.0
+
+
+def _device_code_argv(command: str) -> List[str]:
+    """Split an az login command into argv forcing device code authentication."""
+    # Always force device code authentication for Docker containers
+    # Remove any existing authentication flags that might conflict
+    argv: List[str] = []
+    tokens = iter(shlex.split(command))
+    for token in tokens:
+        if token in _STRIPPED_LOGIN_FLAGS:
+            continue
+        if token in _STRIPPED_LOGIN_OPTIONS:
+            next(tokens, None)  # Skip the option's value as well
+            continue
+        if token.split("=", 1)[0] in _STRIPPED_LOGIN_OPTIONS:
+            continue
+        argv.append(token)
+
+    # Add device code flag
+    argv.append("--use-device-code")
+    return argv
 
 
 class AzureLoginHandler:
     """Handler for Azure CLI login with device code authentication."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self, client_secret: Optional[str] = None, az_path: str = "az"
+    ) -> None:
         """Initialize Azure login handler."""
         self.logger = logging.getLogger(__name__)
+        # az executable to launch, resolved by the caller
+        self._az_path = az_path
+        # Masks credentials passed on the login command line before it is logged
+        self._redactor = SecretRedactor([client_secret])
         self.current_process: Optional[asyncio.subprocess.Process] = None
-        self.logger.info("AzureLoginHandler initialized")
+        # Strong references to background login tasks until they finish
+        self._bg_tasks: Set[asyncio.Task[None]] = set()
+        # Environment for login processes, forcing unbuffered output
+        self._login_env = {**os.environ, "PYTHONUNBUFFERED": "1"}
 
     async def handle_az_login_command(self, command: str) -> str:
         """Handle Azure CLI login with device code authentication."""
-        self.logger.info(f"Handling 'az login' command: {command}")
-
-        # Always force device code authentication for Docker containers
-        # Remove any existing authentication flags that might conflict
-        command = re.sub(r'--use-device-code\b', '', command)
-        command = re.sub(r'--service-principal\b', '', command)
-        command = re.sub(r'--username\b\s+\S+', '', command)
-        command = re.sub(r'--password\b\s+\S+', '', command)
-        command = re.sub(r'--tenant\b\s+\S+', '', command)
-        
-        # Add device code flag
-        command = command.strip() + " --use-device-code"
-        
-        self.logger.info(f"Modified command to use device code: {command}")
+        self.logger.info(
+            "Handling 'az login' command: %s", self._redactor.redact(command)
+        )
 
         try:
+            argv = _device_code_argv(command)
+            argv[0] = self._az_path
+            self.logger.info(
+                "Modified command to use device code: %s",
+                self._redactor.redact(shlex.join(argv)),
+            )
+
             # Cancel previous login process if running
-            if self.current_process and not self.current_process.returncode:
+            if self.current_process and self.current_process.returncode is None:
                 self.logger.info("Cancelling previous 'az login' process")
-                self.current_process.terminate()
+                # The process may exit on its own before it is signalled
+                with contextlib.suppress(ProcessLookupError):
+                    self.current_process.terminate()
                 try:
-                    await asyncio.wait_for(self.current_process.wait(), timeout=5.0)
+                    await asyncio.wait_for(
+                        self.current_process.wait(), timeout=_TERMINATE_TIMEOUT
+                    )
                 except asyncio.TimeoutError:
                     self.logger.warning(
                         "Previous login process did not terminate gracefully"
                     )
-                    self.current_process.kill()
+                    with contextlib.suppress(ProcessLookupError):
+                        self.current_process.kill()
+                    # Reap the killed process so it doesn't linger as a zombie
+                    await self.current_process.wait()
 
             # Start new login process with unbuffered output
-            self.current_process = await asyncio.create_subprocess_shell(
-                command,
+            self.current_process = await asyncio.create_subprocess_exec(
+                *argv,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.STDOUT,  # Redirect stderr to stdout
-                stdin=asyncio.subprocess.PIPE,
-                shell=True,
-                env={**dict(os.environ), "PYTHONUNBUFFERED": "1"}  # Force unbuffered output
+                stdin=asyncio.subprocess.DEVNULL,  # Device code flow never reads stdin
+                env=self._login_env,
+                limit=STREAM_LIMIT,
             )
 
             # Handle login process in background and get result
@@ -65,7 +130,7 @@ class AzureLoginHandler:
             return result
 
         except Exception as e:
-            self.logger.error(f"Error running 'az login' command: {e}")
+            self.logger.error("Error running 'az login' command: %s", e)
             # Clean up process reference on error
             self.current_process = None
             return f"Error: Failed to start login process - {str(e)}"
@@ -77,53 +142,55 @@ class AzureLoginHandler:
         try:
             self.logger.info("Reading device code information from az login")
 
-            device_code_info = []
-            all_output = []
-            
-            # Read from stdout (stderr is redirected to stdout)
+            device_code_info: List[str] = []
+            all_output: List[str] = []
+            reached_eof = False
+
+            # Read stdout (stderr is redirected to stdout) in chunks until the
+            # device code prompt has arrived, the process exits or we time out
             if process.stdout:
-                try:
-                    # Read lines one by one with timeout
-                    for _ in range(30):  # Read up to 30 lines
-                        try:
-                            line = await asyncio.wait_for(process.stdout.readline(), timeout=1.0)
-                            if not line:
-                                break
-                            
-                            decoded_line = line.decode("utf-8").strip()
-                            if decoded_line:
-                                all_output.append(decoded_line)
-                                self.logger.info(f"Azure CLI output: {decoded_line}")
-                                
-                                # Look for device code information
-                                if any(keyword in decoded_line.lower() for keyword in 
-                                      ["device", "code", "browser", "authenticate", "https://", "to sign in", "microsoft.com"]):
-                                    device_code_info.append(decoded_line)
-                                
-                                # If we have device code info, check if we have enough
-                                if device_code_info and (len(device_code_info) >= 2 or "https://" in decoded_line):
-                                    result = "\n".join(device_code_info)
-                                    self.logger.info("Found device code info, returning immediately")
-                                    
-                                    # Continue process in background without blocking
-                                    asyncio.create_task(self._continue_login_background(process))
-                                    
-                                    return result
-                                    
-                        except asyncio.TimeoutError:
-                            # Check if we have any device code info collected so far
-                            if device_code_info:
-                                result = "\n".join(device_code_info)
-                                self.logger.info("Timeout but have device code info, returning it")
-                                asyncio.create_task(self._continue_login_background(process))
-                                return result
-                            continue  # Keep trying to read more lines
-                            
-                except Exception as e:
-                    self.logger.error(f"Error reading stdout: {e}")
-                    
-            # If we didn't get device code info, return what we have
+                output = bytearray()
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + _DEVICE_CODE_TIMEOUT
+                while not (
+                    _DEVICE_CODE_SIGNAL_RE.search(output) and output.endswith(b"\n")
+                ):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        chunk = await asyncio.wait_for(
+                            process.stdout.read(_READ_CHUNK_SIZE), timeout=remaining
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                    if not chunk:
+                        reached_eof = True
+                        break
+                    output += chunk
+
+                # Decode everything collected in one pass
+                text = output.decode("utf-8", errors="replace")
+                all_output = [
+                    line for line in map(str.strip, text.splitlines()) if line
+                ]
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    for line in all_output:
+                        self.logger.debug("Azure CLI output: %s", line)
+
+                # Look for device code information
+                device_code_info = [
+                    line for line in all_output if _DEVICE_CODE_RE.search(line)
+                ]
+
+            if not reached_eof:
+                # Continue process in background without blocking
+                task = asyncio.create_task(self._continue_login_background(process))
+                self._bg_tasks.add(task)
+                task.add_done_callback(self._bg_tasks.discard)
+
             if device_code_info:
+                self.logger.info("Found device code info, returning immediately")
                 return "\n".join(device_code_info)
             elif all_output:
                 return "\n".join(all_output)
@@ -131,7 +198,7 @@ class AzureLoginHandler:
                 return "Device code authentication started. Please check Azure CLI output."
 
         except Exception as e:
-            self.logger.error(f"Error reading device code info: {e}")
+            self.logger.error("Error reading device code info: %s", e)
             return f"Error: {str(e)}"
     
     async def _continue_login_background(self, process: asyncio.subprocess.Process) -> None:
@@ -139,61 +206,44 @@ class AzureLoginHandler:
         try:
             self.logger.info("Continuing login process in background")
             
-            # Read remaining output from both streams
-            async def read_remaining(stream, stream_name):
-                if stream:
-                    try:
-                        async for line in stream:
-                            decoded_line = line.decode("utf-8").strip()
-                            if decoded_line:
-                                self.logger.debug(f"Background {stream_name}: {decoded_line}")
-                    except Exception as e:
-                        self.logger.debug(f"Error reading background {stream_name}: {e}")
-            
-            # Read from both streams concurrently
-            await asyncio.gather(
-                read_remaining(process.stdout, "stdout"),
-                read_remaining(process.stderr, "stderr"),
-                return_exceptions=True
-            )
-            
+            # Drain remaining output (stderr is redirected to stdout)
+            await self._read_lines(process.stdout)
+
             # Wait for completion
             return_code = await process.wait()
             
             if return_code == 0:
                 self.logger.info("Background login completed successfully")
             else:
-                self.logger.warning(f"Background login failed with code: {return_code}")
+                self.logger.warning(
+                    "Background login failed with code: %s", return_code
+                )
                 
         except Exception as e:
-            self.logger.error(f"Error in background login continuation: {e}")
+            self.logger.error("Error in background login continuation: %s", e)
 
-    async def _read_lines(self, stream: asyncio.StreamReader) -> List[str]:
+    async def _read_lines(
+        self, stream: Optional[asyncio.StreamReader]
+    ) -> List[str]:
         """Asynchronously read lines from stream."""
         if not stream:
             return []
 
-        lines = []
+        output = bytearray()
         try:
             while True:
-                line = await stream.readline()
-                if not line:
+                chunk = await stream.read(_DRAIN_CHUNK_SIZE)
+                if not chunk:
                     break
-                try:
-                    decoded_line = line.decode("utf-8").strip()
-                    if decoded_line:  # Skip empty lines
-                        lines.append(decoded_line)
-                        self.logger.debug(f"Read line: {decoded_line}")
-                except UnicodeDecodeError as e:
-                    self.logger.warning(f"Could not decode line: {e}")
-                    # Try with error handling
-                    try:
-                        decoded_line = line.decode("utf-8", errors="replace").strip()
-                        if decoded_line:
-                            lines.append(decoded_line)
-                    except Exception:
-                        pass  # Skip lines that can't be decoded
+                output += chunk
         except Exception as e:
-            self.logger.error(f"Error reading stream: {e}")
+            self.logger.error("Error reading stream: %s", e)
+
+        # Decode everything collected in one pass, skipping empty lines
+        text = output.decode("utf-8", errors="replace")
+        lines = [line for line in map(str.strip, text.splitlines()) if line]
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for line in lines:
+                self.logger.debug("Read line: %s", line)
 
         return lines
@@ -0,0 +1,4 @@
+"""Limits shared by the az subprocess runners."""
+
+# Buffer limit for subprocess pipes, sized for large JSON output from az
+STREAM_LIMIT = 1024 * 1024
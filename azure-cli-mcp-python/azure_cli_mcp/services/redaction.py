@@ -0,0 +1,42 @@
+"""Redaction of credentials from logged commands and output."""
+
+import re
+from typing import Iterable, Optional
+
+# Credential-shaped tokens: values of secret options and bearer tokens (the
+# option itself is kept, quoted values are masked whole), plus common API key
+# and token prefixes
+_CREDENTIAL_SHAPES = (
+    r"(?P<keep>(?:--(?:password|client-secret)|(?<!\S)-p)(?:\s+|=)|\bBearer\s+)"
+    r'(?:"[^"]*"' r"|'[^']*'|\S+)"
+    r"|\bghp_[A-Za-z0-9]{30,}"
+    r"|\bsk-[A-Za-z0-9]{20,}"
+    r"|\bxox[baps]-[A-Za-z0-9-]+"
+)
+
+# Replacement for redacted values
+_MASK = "***"
+
+
+class SecretRedactor:
+    """Mask known secrets and credential-shaped tokens in text."""
+
+    def __init__(self, secrets: Iterable[Optional[str]] = ()) -> None:
+        """Initialize the redactor with secret values known up front."""
+        # Longest first, so a secret containing another one is masked whole
+        known = sorted(
+            {secret for secret in secrets if secret}, key=len, reverse=True
+        )
+        # One alternation covering every secret, scanned in a single pass
+        self._pattern = re.compile(
+            "|".join([*map(re.escape, known), _CREDENTIAL_SHAPES])
+        )
+
+    def redact(self, text: str) -> str:
+        """Return text with every secret replaced by a mask."""
+        return self._pattern.sub(self._mask, text)
+
+    @staticmethod
+    def _mask(match: re.Match[str]) -> str:
+        """Mask a matched secret, keeping any option name before it."""
+        return (match.group("keep") or "") + _MASK
@@ -0,0 +1,127 @@
+"""Shared test fixtures."""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Callable, Iterator, Optional, Tuple
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from azure_cli_mcp.config import Settings
+from azure_cli_mcp.services.azure_cli_service import AzureCliService
+from azure_cli_mcp.services.azure_login_handler import AzureLoginHandler
+
+# Environment the shared test settings are built from
+_BASE_ENV = {
+    "LOG_LEVEL": "INFO",
+    "LOG_FILE": "test.log",
+    "COMMAND_TIMEOUT": "30",
+}
+
+
+class _AsyncBytesReader:
+    """Minimal stand-in for asyncio.StreamReader serving preset chunks."""
+
+    def __init__(self, *chunks: bytes) -> None:
+        self._chunks = [chunk for chunk in chunks if chunk]
+
+    async def read(self, n: int = -1) -> bytes:
+        """Return up to n bytes of the next chunk, or everything when n < 0."""
+        if not self._chunks:
+            return b""
+        if n < 0:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            return data
+        chunk = self._chunks[0]
+        if len(chunk) <= n:
+            return self._chunks.pop(0)
+        self._chunks[0] = chunk[n:]
+        return chunk[:n]
+
+    def at_eof(self) -> bool:
+        """Check whether all data has been read."""
+        return not self._chunks
+
+
+def _make_fake_process(
+    returncode: Optional[int] = 0, stdout: bytes = b"", stderr: bytes = b""
+) -> SimpleNamespace:
+    """Build a lightweight fake of asyncio.subprocess.Process."""
+    return SimpleNamespace(
+        stdout=_AsyncBytesReader(stdout),
+        stderr=_AsyncBytesReader(stderr),
+        stdin=None,
+        returncode=returncode,
+        wait=AsyncMock(return_value=returncode),
+        communicate=AsyncMock(return_value=(stdout, stderr)),
+        terminate=Mock(),
+        kill=Mock(),
+    )
+
+
+@pytest.fixture
+def make_reader() -> Callable[..., _AsyncBytesReader]:
+    """Provide the fake stream reader factory."""
+    return _AsyncBytesReader
+
+
+@pytest.fixture
+def make_fake_process() -> Callable[..., SimpleNamespace]:
+    """Provide the fake subprocess factory."""
+    return _make_fake_process
+
+
+@pytest.fixture
+def fake_subprocess(
+    monkeypatch: pytest.MonkeyPatch,
+    make_fake_process: Callable[..., SimpleNamespace],
+) -> Tuple[AsyncMock, SimpleNamespace]:
+    """Patch subprocess creation to return a fake process that succeeds."""
+    # The fake only has attributes real processes have, so using anything
+    # else raises AttributeError
+    process = make_fake_process(stdout=b"output")
+    mock_create = AsyncMock(return_value=process)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", mock_create)
+    return mock_create, process
+
+
+@pytest.fixture(scope="module")
+def _shared_login_handler() -> AzureLoginHandler:
+    """Create one login handler for all tests in a module."""
+    return AzureLoginHandler()
+
+
+@pytest.fixture
+def handler(_shared_login_handler: AzureLoginHandler) -> Iterator[AzureLoginHandler]:
+    """Provide the shared login handler with per-test state reset."""
+    _shared_login_handler.current_process = None
+    _shared_login_handler._bg_tasks.clear()
+    yield _shared_login_handler
+    _shared_login_handler.current_process = None
+    _shared_login_handler._bg_tasks.clear()
+
+
+@pytest.fixture(scope="session")
+def base_settings() -> Settings:
+    """Build settings from the base test environment once per session."""
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in _BASE_ENV.items():
+            mp.setenv(key, value)
+        return Settings()
+
+
+@pytest.fixture
+def service(base_settings: Settings) -> AzureCliService:
+    """Provide a fresh service, since tests patch its attributes."""
+    return AzureCliService(base_settings)
+
+
+@pytest.fixture
+def env_service(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> AzureCliService:
+    """Build a service from the base test environment plus indirect overrides."""
+    for key, value in {**_BASE_ENV, **request.param}.items():
+        monkeypatch.setenv(key, value)
+    return AzureCliService(Settings())
@@ -1,82 +1,66 @@
 """Tests for Azure Login Handler."""
 
 import asyncio
+import logging
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
+
 from azure_cli_mcp.services.azure_login_handler import AzureLoginHandler
 
 
 class TestAzureLoginHandler:
     """Test cases for Azure Login Handler."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.handler = AzureLoginHandler()
-    
-    def test_initialization(self):
+    def test_initialization(self, handler):
         """Test handler initialization."""
-        assert self.handler.logger is not None
-        assert self.handler.current_process is None
+        assert handler.logger is not None
+        assert handler.current_process is None
     
     @pytest.mark.asyncio
-    async def test_handle_az_login_command_device_code(self):
+    async def test_handle_az_login_command_device_code(self, handler, make_fake_process):
         """Test handling az login command with device code."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
+        mock_process = make_fake_process()
 
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process) as mock_create:
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
-                result = await self.handler.handle_az_login_command("az login")
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
+                result = await handler.handle_az_login_command("az login")
 
                 assert result == "Login successful"
                 mock_background.assert_called_once_with(mock_process)
                 # Should add device code flag if not present
                 mock_create.assert_called_once()
-                call_args = mock_create.call_args[0][0]
-                assert "--use-device-code" in call_args
+                call_args = mock_create.call_args[0]
+                assert call_args == ("az", "login", "--use-device-code")
+                assert mock_create.call_args.kwargs["stdin"] == asyncio.subprocess.DEVNULL
     
     @pytest.mark.asyncio
-    async def test_handle_az_login_command_already_has_device_code(self):
+    async def test_handle_az_login_command_already_has_device_code(self, handler, make_fake_process):
         """Test handling az login command that already has device code flag."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
+        mock_process = make_fake_process()
 
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process) as mock_create:
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
-                result = await self.handler.handle_az_login_command("az login --use-device-code")
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
+                result = await handler.handle_az_login_command("az login --use-device-code")
 
                 assert result == "Login successful"
                 mock_background.assert_called_once_with(mock_process)
                 # Should not add duplicate device code flag
                 mock_create.assert_called_once()
-                call_args = mock_create.call_args[0][0]
-                assert call_args.count("--use-device-code") == 1
+                call_args = mock_create.call_args[0]
+                assert call_args == ("az", "login", "--use-device-code")
     
     @pytest.mark.asyncio
-    async def test_handle_az_login_command_with_existing_process(self):
+    async def test_handle_az_login_command_with_existing_process(self, handler, make_fake_process):
         """Test handling login command with existing process."""
         # Set up existing process
-        existing_process = MagicMock()
-        existing_process.returncode = None  # Still running
-        existing_process.terminate = MagicMock()
-        existing_process.wait = AsyncMock(return_value=0)
-        self.handler.current_process = existing_process
-
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
-
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process) as mock_create:
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
-                result = await self.handler.handle_az_login_command("az login")
+        existing_process = make_fake_process(returncode=None)  # Still running
+        handler.current_process = existing_process
+
+        mock_process = make_fake_process()
+
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
+                result = await handler.handle_az_login_command("az login")
 
                 assert result == "Login successful"
                 # Should terminate existing process
@@ -84,98 +68,99 @@ class TestAzureLoginHandler:
                 mock_background.assert_called_once_with(mock_process)
     
     @pytest.mark.asyncio
-    async def test_handle_az_login_command_process_creation_failure(self):
+    async def test_handle_az_login_command_process_creation_failure(self, handler):
         """Test handling login command when process creation fails."""
-        with patch('asyncio.create_subprocess_shell') as mock_create:
+        with patch('asyncio.create_subprocess_exec') as mock_create:
             mock_create.side_effect = Exception("Process creation failed")
     
-            result = await self.handler.handle_az_login_command("az login")
+            result = await handler.handle_az_login_command("az login")
 
             assert result.startswith("Error: Failed to start login process")
     
     @pytest.mark.asyncio
-    async def test_handle_login_background_with_device_code(self):
+    async def test_handle_login_background_with_device_code(self, handler, make_fake_process):
         """Test background login handling with device code."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
-
-        # Mock the _read_lines method
-        mock_stdout_lines = [
-            "To sign in, use a web browser to open the page https://microsoft.com/devicelogin",
-            "and enter the code ABC123 to authenticate."
-        ]
-        mock_stderr_lines = ["Warning: some warning"]
+        # Device code prompt arrives, then az waits for the user
+        mock_process = make_fake_process(returncode=None, stdout=(
+            b"To sign in, use a web browser to open the page https://microsoft.com/devicelogin\n"
+            b"and enter the code ABC123 to authenticate.\n"
+        ))
 
-        with patch.object(self.handler, '_read_lines') as mock_read:
-            mock_read.side_effect = [
-                mock_stdout_lines,  # First call for stdout
-                mock_stderr_lines   # Second call for stderr
-            ]
-
-            # Mock wait as an async method
-            mock_process.wait = AsyncMock(return_value=0)
-            
-            result = await self.handler._handle_login_background(mock_process)
+        with patch.object(handler, '_continue_login_background') as mock_continue:
+            result = await handler._handle_login_background(mock_process)
 
             # Should return device code information
             assert "device" in result.lower() or "code" in result.lower()
-            assert len(result) > 0
+            assert "https://microsoft.com/devicelogin" in result
+            # Process keeps running, so the rest is drained in the background
+            mock_continue.assert_called_once_with(mock_process)
+            assert mock_process.stdout.at_eof()
     
     @pytest.mark.asyncio
-    async def test_handle_login_background_process_failure(self):
+    async def test_handle_login_background_process_failure(self, handler, make_fake_process):
         """Test background login handling when process fails."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 1
-
-        mock_stdout_lines = ["Error: Login failed"]
-        mock_stderr_lines = ["Authentication error"]
-
-        with patch.object(self.handler, '_read_lines') as mock_read:
-            mock_read.side_effect = [mock_stdout_lines, mock_stderr_lines]
+        mock_process = make_fake_process(returncode=1, stdout=b"Error: Login failed\n")
 
-            # Mock wait as an async method
-            mock_process.wait = AsyncMock(return_value=1)
-            
-            result = await self.handler._handle_login_background(mock_process)
+        with patch.object(handler, '_continue_login_background') as mock_continue:
+            result = await handler._handle_login_background(mock_process)
 
             assert result == "Error: Login failed"
+            # Output reached EOF, so there is nothing left to drain
+            mock_continue.assert_not_called()
     
     @pytest.mark.asyncio
-    async def test_handle_login_background_exception(self):
+    async def test_handle_login_background_exception(self, handler, make_fake_process):
         """Test background login handling with exception."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
+        mock_process = make_fake_process()
+        mock_process.stdout.read = AsyncMock(side_effect=Exception("Reading failed"))
+
+        result = await handler._handle_login_background(mock_process)
+
+        assert result.startswith("Error:")
+        assert "Reading failed" in result
+    
+    @pytest.mark.asyncio
+    async def test_background_login_task_is_tracked_until_done(self, handler, make_fake_process):
+        """Test background login tasks are referenced until they complete."""
+        mock_process = make_fake_process(returncode=None, stdout=(
+            b"To sign in, use a web browser to open the page https://microsoft.com/devicelogin\n"
+        ))
+
+        finished = asyncio.Event()
+
+        async def continue_login(process):
+            await finished.wait()
 
-        with patch.object(self.handler, '_read_lines') as mock_read:
-            mock_read.side_effect = Exception("Reading failed")
+        with patch.object(handler, '_continue_login_background', side_effect=continue_login):
+            await handler._handle_login_background(mock_process)
 
-            result = await self.handler._handle_login_background(mock_process)
+            assert len(handler._bg_tasks) == 1
+            task = next(iter(handler._bg_tasks))
 
-            assert result.startswith("Error:")
-            assert "Reading failed" in result
+            finished.set()
+            await task
+            await asyncio.sleep(0)
+
+            assert not handler._bg_tasks
     
     @pytest.mark.asyncio
-    async def test_read_lines_normal_operation(self):
-        """Test reading lines from stream."""
-        mock_stream = AsyncMock()
-        mock_lines = [b"Line 1\n", b"Line 2\n", b"Line 3\n", b""]  # EOF
+    async def test_continue_login_background_reads_stdout_only(self, handler, make_fake_process):
+        """Test the background continuation drains stdout and waits for exit."""
+        mock_process = make_fake_process()
 
-        # Create a proper async iterator
-        async def mock_readline():
-            for line in mock_lines:
-                return line
+        with patch.object(handler, '_read_lines', return_value=[]) as mock_read:
+            await handler._continue_login_background(mock_process)
 
-        mock_stream.readline = AsyncMock(side_effect=mock_lines)
+            mock_read.assert_called_once_with(mock_process.stdout)
+            mock_process.wait.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_read_lines_normal_operation(self, handler, make_reader):
+        """Test reading lines from stream."""
+        # Chunk boundaries don't line up with line boundaries
+        mock_stream = make_reader(b"Line 1\nLi", b"ne 2\nLine 3\n")
 
-        result = await self.handler._read_lines(mock_stream)
+        result = await handler._read_lines(mock_stream)
 
         assert len(result) == 3
         assert result[0] == "Line 1"
@@ -183,146 +168,214 @@ class TestAzureLoginHandler:
         assert result[2] == "Line 3"
     
     @pytest.mark.asyncio
-    async def test_read_lines_empty_stream(self):
+    async def test_read_lines_empty_stream(self, handler, make_reader):
         """Test reading lines from empty stream."""
-        mock_stream = AsyncMock()
-        mock_stream.readline = AsyncMock(return_value=b"")
+        mock_stream = make_reader()
 
-        result = await self.handler._read_lines(mock_stream)
+        result = await handler._read_lines(mock_stream)
 
         assert result == []
     
     @pytest.mark.asyncio
-    async def test_read_lines_with_unicode(self):
+    async def test_read_lines_with_unicode(self, handler, make_reader):
         """Test reading lines with Unicode characters."""
-        mock_stream = AsyncMock()
-        mock_lines = [b"Line with \xc3\xa9 accent\n", b"Another line\n", b""]
-
-        mock_stream.readline = AsyncMock(side_effect=mock_lines)
+        # Multi-byte character split across two reads
+        mock_stream = make_reader(b"Line with \xc3", b"\xa9 accent\nAnother line\n")
 
-        result = await self.handler._read_lines(mock_stream)
+        result = await handler._read_lines(mock_stream)
 
         assert len(result) == 2
         assert "é" in result[0]  # Should properly decode UTF-8
         assert result[1] == "Another line"
     
     @pytest.mark.asyncio
-    async def test_read_lines_decode_error(self):
-        """Test reading lines with decode errors."""
-        mock_stream = AsyncMock()
-        mock_lines = [b"\xff\xfe invalid utf-8\n", b""]
+    async def test_read_lines_code_point_split_before_newline(self, handler, make_reader):
+        """Test a character split across reads right before a line break."""
+        mock_stream = make_reader(b"caf\xc3", b"\xa9\n", b"next\n")
 
-        mock_stream.readline = AsyncMock(side_effect=mock_lines)
+        result = await handler._read_lines(mock_stream)
 
-        result = await self.handler._read_lines(mock_stream)
+        assert result == ["café", "next"]
+    
+    @pytest.mark.asyncio
+    async def test_read_lines_decode_error(self, handler, make_reader):
+        """Test reading lines with decode errors."""
+        mock_stream = make_reader(b"\xff\xfe invalid utf-8\n")
+
+        result = await handler._read_lines(mock_stream)
 
-        # Should handle decode errors gracefully
-        assert len(result) >= 0  # Should not crash
+        # Undecodable bytes are replaced rather than dropping the line
+        assert result == ["\ufffd\ufffd invalid utf-8"]
     
     @pytest.mark.asyncio
-    async def test_process_cleanup_on_success(self):
+    async def test_process_cleanup_on_success(self, handler, make_fake_process):
         """Test process cleanup after successful login."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
+        mock_process = make_fake_process()
 
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process):
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
-                await self.handler.handle_az_login_command("az login")
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process):
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
+                await handler.handle_az_login_command("az login")
 
                 # Process should be cleared after completion
-                assert self.handler.current_process is None
+                assert handler.current_process is None
     
     @pytest.mark.asyncio
-    async def test_process_cleanup_on_failure(self):
+    async def test_process_cleanup_on_failure(self, handler, make_fake_process):
         """Test process cleanup after failed login."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 1
+        mock_process = make_fake_process(returncode=1)
 
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process):
-            with patch.object(self.handler, '_handle_login_background', return_value="Error: Login failed") as mock_background:
-                await self.handler.handle_az_login_command("az login")
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process):
+            with patch.object(handler, '_handle_login_background', return_value="Error: Login failed") as mock_background:
+                await handler.handle_az_login_command("az login")
 
                 # Process should be cleared even after failure
-                assert self.handler.current_process is None
+                assert handler.current_process is None
     
     @pytest.mark.asyncio
-    async def test_multiple_concurrent_login_attempts(self):
+    async def test_multiple_concurrent_login_attempts(self, handler, make_fake_process):
         """Test handling multiple concurrent login attempts."""
-        mock_process1 = MagicMock()
-        mock_process1.returncode = None  # Still running
-        mock_process1.terminate = MagicMock()
-        mock_process1.wait = AsyncMock(return_value=0)
-
-        mock_process2 = MagicMock()
-        mock_process2.stdout = AsyncMock()
-        mock_process2.stderr = AsyncMock()
-        mock_process2.stdin = MagicMock()
-        mock_process2.returncode = 0
-
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process2):
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
+        mock_process1 = make_fake_process(returncode=None)  # Still running
+
+        mock_process2 = make_fake_process()
+
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process2):
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
                 # Start first login
-                self.handler.current_process = mock_process1
+                handler.current_process = mock_process1
 
                 # Start second login (should terminate first)
-                result = await self.handler.handle_az_login_command("az login")
+                result = await handler.handle_az_login_command("az login")
 
                 assert result == "Login successful"
                 # Should terminate first process
                 mock_process1.terminate.assert_called_once()
     
-    def test_logger_configuration(self):
+    def test_logger_configuration(self, handler):
         """Test logger is properly configured."""
-        assert self.handler.logger.name == "azure_cli_mcp.services.azure_login_handler"
+        assert handler.logger.name == "azure_cli_mcp.services.azure_login_handler"
     
     @pytest.mark.asyncio
-    async def test_handle_az_login_command_with_additional_flags(self):
+    async def test_handle_az_login_command_with_additional_flags(self, handler, make_fake_process):
         """Test handling login command with additional flags."""
-        mock_process = MagicMock()
-        mock_process.stdout = AsyncMock()
-        mock_process.stderr = AsyncMock()
-        mock_process.stdin = MagicMock()
-        mock_process.returncode = 0
+        mock_process = make_fake_process()
 
-        with patch('asyncio.create_subprocess_shell', return_value=mock_process) as mock_create:
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful") as mock_background:
-                result = await self.handler.handle_az_login_command("az login --tenant test-tenant")
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful") as mock_background:
+                result = await handler.handle_az_login_command("az login --tenant test-tenant")
 
                 assert result == "Login successful"
                 mock_background.assert_called_once_with(mock_process)
                 # Should preserve additional flags
-                call_args = mock_create.call_args[0][0]
-                assert "--tenant test-tenant" in call_args
+                call_args = mock_create.call_args[0]
+                assert "--tenant" in call_args
+                assert "test-tenant" in call_args
                 assert "--use-device-code" in call_args
     
     @pytest.mark.asyncio
-    async def test_process_termination_timeout(self):
+    async def test_handle_az_login_command_strips_conflicting_auth_flags(self, handler, make_fake_process):
+        """Test service principal credentials are dropped as whole tokens."""
+        mock_process = make_fake_process()
+
+        with patch('asyncio.create_subprocess_exec', return_value=mock_process) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful"):
+                await handler.handle_az_login_command(
+                    "az login --service-principal --username app-id "
+                    "--password=s3cret --allow-no-subscriptions --use-device-code "
+                    "-u app-id -p s3cret --tenant t"
+                )
+
+                assert mock_create.call_args[0] == (
+                    "az", "login", "--allow-no-subscriptions", "--tenant", "t",
+                    "--use-device-code",
+                )
+    
+    @pytest.mark.asyncio
+    async def test_handle_az_login_command_uses_resolved_az_path(self, make_fake_process):
+        """Test the login process is launched with the resolved az executable."""
+        handler = AzureLoginHandler(az_path="/opt/az/bin/az")
+
+        with patch('asyncio.create_subprocess_exec', return_value=make_fake_process()) as mock_create:
+            with patch.object(handler, '_handle_login_background', return_value="Login successful"):
+                await handler.handle_az_login_command("az login")
+
+                assert mock_create.call_args[0] == (
+                    "/opt/az/bin/az", "login", "--use-device-code"
+                )
+    
+    @pytest.mark.asyncio
+    async def test_handle_az_login_command_redacts_modified_command_log(
+        self, make_fake_process, caplog
+    ):
+        """Test a known secret never reaches the logged device code command."""
+        handler = AzureLoginHandler(client_secret="s3cr3t-value")
+
+        with patch('asyncio.create_subprocess_exec', return_value=make_fake_process()):
+            with patch.object(handler, '_handle_login_background', return_value="Login successful"):
+                with caplog.at_level(logging.INFO):
+                    await handler.handle_az_login_command(
+                        "az login --federated-token s3cr3t-value"
+                    )
+
+        messages = [
+            r.getMessage() for r in caplog.records
+            if r.msg.startswith("Modified command to use device code")
+        ]
+        assert messages
+        assert all("s3cr3t-value" not in message for message in messages)
+    
+    @pytest.mark.asyncio
+    async def test_handle_az_login_command_unbalanced_quotes(self, handler):
+        """Test a command that can't be tokenized returns an error."""
+        with patch('asyncio.create_subprocess_exec') as mock_create:
+            result = await handler.handle_az_login_command('az login --output "json')
+
+            assert result.startswith("Error: Failed to start login process")
+            mock_create.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_process_termination_timeout(self, handler, make_fake_process):
         """Test process termination with timeout."""
-        mock_process = MagicMock()
-        mock_process.returncode = None  # Still running
-        mock_process.terminate = MagicMock()
-        mock_process.wait = AsyncMock(side_effect=asyncio.TimeoutError())
-        mock_process.kill = MagicMock()
-
-        self.handler.current_process = mock_process
-
-        new_mock_process = MagicMock()
-        new_mock_process.stdout = AsyncMock()
-        new_mock_process.stderr = AsyncMock()
-        new_mock_process.stdin = MagicMock()
-        new_mock_process.returncode = 0
-
-        with patch('asyncio.create_subprocess_shell', return_value=new_mock_process):
-            with patch.object(self.handler, '_handle_login_background', return_value="Login successful"):
-                result = await self.handler.handle_az_login_command("az login")
-
-                # Should attempt to terminate and then kill
-                mock_process.terminate.assert_called_once()
-                mock_process.kill.assert_called_once()
-                assert result == "Login successful" 
\ No newline at end of file
+        calls = []
+        wait_results = [asyncio.TimeoutError(), -9]
+
+        async def wait():
+            calls.append("wait")
+            result = wait_results.pop(0)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        mock_process = make_fake_process(returncode=None)  # Still running
+        # Graceful wait times out, then the killed process is reaped
+        mock_process.wait = wait
+        mock_process.terminate.side_effect = lambda: calls.append("terminate")
+        mock_process.kill.side_effect = lambda: calls.append("kill")
+
+        handler.current_process = mock_process
+
+        new_mock_process = make_fake_process()
+
+        with patch('asyncio.create_subprocess_exec', return_value=new_mock_process):
+            with patch('asyncio.wait_for', wraps=asyncio.wait_for) as mock_wait_for:
+                with patch.object(handler, '_handle_login_background', return_value="Login successful"):
+                    result = await handler.handle_az_login_command("az login")
+
+                # Graceful termination is bounded by a short timeout
+                assert mock_wait_for.call_args.kwargs["timeout"] == 2.0
+                # Should terminate, then kill and reap the process
+                assert calls == ["terminate", "wait", "kill", "wait"]
+                assert result == "Login successful"
+    
+    @pytest.mark.asyncio
+    async def test_exited_process_is_not_terminated(self, handler, make_fake_process):
+        """Test that a previous login that already exited is left alone."""
+        exited_process = make_fake_process(returncode=0)
+        handler.current_process = exited_process
+
+        with patch('asyncio.create_subprocess_exec', return_value=make_fake_process()):
+            with patch.object(handler, '_handle_login_background', return_value="Login successful"):
+                await handler.handle_az_login_command("az login")
+
+        exited_process.terminate.assert_not_called()
+        exited_process.kill.assert_not_called()
+
@@ -1,11 +1,12 @@
 """Unit tests for config module."""
 
+import json
 import os
 import pytest
 from unittest.mock import patch, MagicMock
 from pydantic import ValidationError
 
-from azure_cli_mcp.config import Settings
+from azure_cli_mcp.config import Settings, get_settings
 
 
 class TestSettings:
@@ -25,7 +26,29 @@ class TestSettings:
         assert settings.max_concurrent_commands == 5
 
 
-    def test_settings_from_env_vars(self):
+    def test_settings_from_init_kwargs(self):
+        """Test constructing settings directly from aliased values."""
+        settings = Settings(
+            LOG_LEVEL="debug",
+            LOG_FILE="test.log",
+            AZURE_TENANT_ID="test-tenant",
+            AZURE_CLIENT_ID="test-client",
+            AZURE_CLIENT_SECRET="test-secret",
+            AZURE_SUBSCRIPTION_ID="test-sub",
+            COMMAND_TIMEOUT=600,
+            MAX_CONCURRENT_COMMANDS=10,
+        )
+
+        assert settings.log_level == "DEBUG"
+        assert settings.log_file == "test.log"
+        assert settings.azure_tenant_id == "test-tenant"
+        assert settings.azure_client_id == "test-client"
+        assert settings.azure_client_secret == "test-secret"
+        assert settings.azure_subscription_id == "test-sub"
+        assert settings.command_timeout == 600
+        assert settings.max_concurrent_commands == 10
+
+    def test_settings_from_env_vars_integration(self):
         """Test loading settings from environment variables."""
         env_vars = {
             "LOG_LEVEL": "DEBUG",
@@ -57,23 +80,23 @@ class TestSettings:
         assert settings.azure_credentials is None
         
         # Test with partial credentials
-        with patch.dict(os.environ, {"AZURE_TENANT_ID": "test-tenant"}):
-            settings = Settings()
-            assert settings.azure_credentials is None
+        settings = Settings(AZURE_TENANT_ID="test-tenant")
+        assert settings.azure_credentials is None
         
         # Test with complete credentials
-        env_vars = {
-            "AZURE_TENANT_ID": "test-tenant",
-            "AZURE_CLIENT_ID": "test-client",
-            "AZURE_CLIENT_SECRET": "test-secret"
-        }
-        with patch.dict(os.environ, env_vars):
-            settings = Settings()
-            credentials = settings.azure_credentials
-            assert credentials is not None
-            assert credentials["tenant_id"] == "test-tenant"
-            assert credentials["client_id"] == "test-client"
-            assert credentials["client_secret"] == "test-secret"
+        settings = Settings(
+            AZURE_TENANT_ID="test-tenant",
+            AZURE_CLIENT_ID="test-client",
+            AZURE_CLIENT_SECRET="test-secret",
+        )
+        credentials = settings.azure_credentials
+        assert credentials is not None
+        assert credentials["tenant_id"] == "test-tenant"
+        assert credentials["client_id"] == "test-client"
+        assert credentials["client_secret"] == "test-secret"
+        # Computed once and not part of the serialized settings
+        assert settings.azure_credentials is credentials
+        assert "azure_credentials" not in settings.model_dump()
 
     def test_has_azure_credentials(self):
         """Test has_azure_credentials method."""
@@ -82,19 +105,41 @@ class TestSettings:
         assert not settings.has_azure_credentials()
         
         # Test with partial credentials
-        with patch.dict(os.environ, {"AZURE_TENANT_ID": "test-tenant"}):
-            settings = Settings()
-            assert not settings.has_azure_credentials()
+        settings = Settings(AZURE_TENANT_ID="test-tenant")
+        assert not settings.has_azure_credentials()
         
+        # Test with complete credentials
+        settings = Settings(
+            AZURE_TENANT_ID="test-tenant",
+            AZURE_CLIENT_ID="test-client",
+            AZURE_CLIENT_SECRET="test-secret",
+        )
+        assert settings.has_azure_credentials()
+
+    def test_get_azure_credentials_json(self):
+        """Test get_azure_credentials_json method."""
+        # Test with no credentials
+        settings = Settings()
+        assert settings.get_azure_credentials_json() is None
+
         # Test with complete credentials
         env_vars = {
             "AZURE_TENANT_ID": "test-tenant",
             "AZURE_CLIENT_ID": "test-client",
-            "AZURE_CLIENT_SECRET": "test-secret"
+            "AZURE_CLIENT_SECRET": "test-secret",
+            "AZURE_SUBSCRIPTION_ID": "test-sub"
         }
         with patch.dict(os.environ, env_vars):
             settings = Settings()
-            assert settings.has_azure_credentials()
+            credentials_json = settings.get_azure_credentials_json()
+            assert json.loads(credentials_json) == {
+                "tenantId": "test-tenant",
+                "clientId": "test-client",
+                "clientSecret": "test-secret",
+                "subscriptionId": "test-sub"
+            }
+            # Serialized once per immutable settings instance
+            assert settings.get_azure_credentials_json() is credentials_json
 
     def test_invalid_log_level(self):
         """Test validation of log level."""
@@ -103,30 +148,21 @@ class TestSettings:
             # Should convert invalid log level to default INFO
             assert settings.log_level == "INFO"  # Our validator converts invalid values to INFO
 
-
-
-    def test_invalid_timeout(self):
-        """Test validation of timeout value."""
-        with patch.dict(os.environ, {"COMMAND_TIMEOUT": "invalid"}):
+    @pytest.mark.parametrize("env_var,value", [
+        ("COMMAND_TIMEOUT", "invalid"),
+        ("COMMAND_TIMEOUT", "-1"),
+        ("COMMAND_TIMEOUT", "0"),
+        ("COMMAND_TIMEOUT", "3601"),
+        ("MAX_CONCURRENT_COMMANDS", "invalid"),
+        ("MAX_CONCURRENT_COMMANDS", "0"),
+        ("MAX_CONCURRENT_COMMANDS", "51"),
+    ])
+    def test_invalid_numeric_values(self, env_var, value):
+        """Test validation rejects non-numeric and out-of-range values."""
+        with patch.dict(os.environ, {env_var: value}):
             with pytest.raises(ValidationError):
                 Settings()
 
-    def test_invalid_max_concurrent(self):
-        """Test validation of max concurrent commands."""
-        with patch.dict(os.environ, {"MAX_CONCURRENT_COMMANDS": "invalid"}):
-            with pytest.raises(ValidationError):
-                Settings()
-
-    def test_negative_values(self):
-        """Test handling of negative values."""
-        with patch.dict(os.environ, {"COMMAND_TIMEOUT": "-1"}):
-            with pytest.raises(ValidationError):
-                Settings()
-
-
-
-
-
     def test_settings_immutability(self):
         """Test that settings are immutable after creation."""
         settings = Settings()
@@ -154,6 +190,30 @@ class TestSettings:
             settings = Settings()
             data = settings.model_dump()
             
-            # The secret should be included in the dump by default
-            # but in a real scenario, we might want to exclude it
-            assert "azure_client_secret" in data 
\ No newline at end of file
+            # The secret is included in the full dump by default
+            assert "azure_client_secret" in data
+
+            # but left out of the safe dump
+            safe_data = settings.safe_dump()
+            assert "azure_client_secret" not in safe_data
+            assert "log_level" in safe_data
+
+    def test_get_settings_is_cached(self):
+        """Test get_settings returns the same instance on every call."""
+        assert get_settings() is get_settings()
+
+    def test_get_settings_cache_clear_rereads_environment(self):
+        """Test clearing the cache makes get_settings re-read the environment."""
+        get_settings.cache_clear()
+        try:
+            with patch.dict(os.environ, {"LOG_LEVEL": "DEBUG"}):
+                assert get_settings().log_level == "DEBUG"
+
+            # Still cached after the environment changes back
+            assert get_settings().log_level == "DEBUG"
+
+            get_settings.cache_clear()
+            with patch.dict(os.environ, {"LOG_LEVEL": "ERROR"}):
+                assert get_settings().log_level == "ERROR"
+        finally:
+            get_settings.cache_clear()
@@ -1,11 +1,11 @@
 """Integration tests for the complete MCP server functionality."""
 
 import asyncio
+import logging
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import patch, AsyncMock
 import json
-import os
-import tempfile
+from types import SimpleNamespace
 
 from mcp.types import (
     Tool,
@@ -15,48 +15,61 @@ from mcp.types import (
     CallToolResult,
 )
 
+from azure_cli_mcp import main as _main_mod
 from azure_cli_mcp.main import main, create_azure_cli_tool
 from azure_cli_mcp.services.azure_cli_service import AzureCliService
 from azure_cli_mcp.services.azure_login_handler import AzureLoginHandler
 from azure_cli_mcp.config import Settings
 
 
+# Fixed error results, shared across tool calls
+_ERR_NO_SERVICE = CallToolResult(
+    content=[
+        TextContent(type="text", text="Error: Azure CLI service not initialized")
+    ],
+    isError=False,
+)
+_ERR_MISSING = CallToolResult(
+    content=[TextContent(type="text", text="Error: Missing command argument")],
+    isError=False,
+)
+_ERR_NOT_STR = CallToolResult(
+    content=[TextContent(type="text", text="Error: Command must be a string")],
+    isError=False,
+)
+
+
+def _validate(request):
+    """Validate a tool call, returning an error result or the command."""
+    if not _main_mod.azure_cli_service:
+        return _ERR_NO_SERVICE
+
+    # Validate arguments
+    if not request.params.arguments or "command" not in request.params.arguments:
+        return _ERR_MISSING
+
+    command = request.params.arguments["command"]
+    if not isinstance(command, str):
+        return _ERR_NOT_STR
+
+    return command
+
+
 async def handle_azure_cli_tool(request):
     """Test helper function to simulate MCP tool handling."""
-    from mcp.types import CallToolResult, TextContent
-    
     try:
-        # Get the global service instance
-        import azure_cli_mcp.main
-        service = azure_cli_mcp.main.azure_cli_service
-        
-        if not service:
-            return CallToolResult(
-                content=[TextContent(type="text", text="Error: Azure CLI service not initialized")],
-                isError=False
-            )
-        
-        # Validate arguments
-        if not request.params.arguments or "command" not in request.params.arguments:
-            return CallToolResult(
-                content=[TextContent(type="text", text="Error: Missing command argument")],
-                isError=False
-            )
-        
-        command = request.params.arguments["command"]
-        if not isinstance(command, str):
-            return CallToolResult(
-                content=[TextContent(type="text", text="Error: Command must be a string")],
-                isError=False
-            )
-        
+        # Validation errors are returned without suspending
+        command = _validate(request)
+        if isinstance(command, CallToolResult):
+            return command
+
         # Execute the command
-        result = await service.execute_azure_cli(command)
+        result = await _main_mod.azure_cli_service.execute_azure_cli(command)
         return CallToolResult(
             content=[TextContent(type="text", text=result)],
             isError=False
         )
-        
+
     except Exception as e:
         return CallToolResult(
             content=[TextContent(type="text", text=f"Error: {str(e)}")],
@@ -64,368 +77,277 @@ async def handle_azure_cli_tool(request):
         )
 
 
+def _const_coro(value):
+    """Build an async stub that always returns value, without call tracking."""
+    async def _stub(*args, **kwargs):
+        return value
+    return _stub
+
+
+def _mk_req(**arguments):
+    """Build a tool call request without pydantic validation."""
+    return CallToolRequest.model_construct(
+        method="tools/call",
+        params=CallToolRequestParams.model_construct(
+            name="execute_azure_cli_command", arguments=arguments
+        ),
+    )
+
+
+# Output of a mocked `az --version`
+_AZ_VERSION_OUTPUT = "azure-cli 2.0.0"
+
+# Error returned for commands that do not start with az
+_INVALID_COMMAND_ERROR = "Error: Invalid command. Command must start with 'az'."
+
+# Large command output to check nothing is truncated
+_LARGE_OUTPUT = "x" * 10000
+
+# Command output with non-ASCII characters
+_UNICODE_OUTPUT = "Azure CLI with émojis: 🚀 and accénts"
+
+# Environment providing complete service principal credentials
+_CREDENTIALS_ENV = {
+    "AZURE_TENANT_ID": "test-tenant",
+    "AZURE_CLIENT_ID": "test-client",
+    "AZURE_CLIENT_SECRET": "test-secret"
+}
+
+
+@pytest.fixture(scope="session")
+def azure_cli_tool():
+    """Provide the MCP tool definition."""
+    return _main_mod.AZURE_CLI_TOOL
+
+
+@pytest.fixture(scope="session")
+def azure_creds_json():
+    """Serialize the service principal test credentials once per session."""
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in _CREDENTIALS_ENV.items():
+            mp.setenv(key, value)
+        return Settings().get_azure_credentials_json()
+
+
+@pytest.mark.xdist_group("integration")
 class TestIntegration:
     """Integration tests for the complete system."""
 
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.test_env = {
-            "LOG_LEVEL": "INFO",
-            "LOG_FILE": "test.log",
-            "COMMAND_TIMEOUT": "30"
-        }
-
-    @pytest.mark.asyncio
-    async def test_complete_mcp_workflow(self):
-        """Test complete MCP workflow from tool creation to execution."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Set up global service for MCP handler
-            import azure_cli_mcp.main
-            azure_cli_mcp.main.azure_cli_service = service
-            
-            # Test tool creation
-            tool = create_azure_cli_tool()
-            assert tool.name == "execute_azure_cli_command"
-            assert "Azure CLI" in tool.description
-            
-            # Test tool execution
-            with patch.object(service, 'execute_azure_cli') as mock_execute:
-                mock_execute.return_value = "azure-cli 2.0.0"
-                
-                request = CallToolRequest(
-                    method="tools/call",
-                    params=CallToolRequestParams(
-                        name="execute_azure_cli_command",
-                        arguments={"command": "az --version"}
-                    )
-                )
-                
-                result = await handle_azure_cli_tool(request)
-                
-                assert not result.isError
-                assert len(result.content) == 1
-                assert isinstance(result.content[0], TextContent)
-                assert result.content[0].text == "azure-cli 2.0.0"
-
-    @pytest.mark.asyncio
-    async def test_end_to_end_azure_command_execution(self):
+    def test_tool_definition(self, azure_cli_tool):
+        """Test the MCP tool definition exposed by the server."""
+        tool = azure_cli_tool
+        assert tool.name == "execute_azure_cli_command"
+        assert "Azure CLI" in tool.description
+        # Built once at import and shared with the server's tool list
+        assert create_azure_cli_tool() == tool
+        assert _main_mod._TOOLS_LIST[0] is tool
+
+    def test_call_tool_request_schema(self):
+        """Test a tool call request passes pydantic validation."""
+        request = CallToolRequest(
+            method="tools/call",
+            params=CallToolRequestParams(
+                name="execute_azure_cli_command",
+                arguments={"command": "az --version"}
+            )
+        )
+
+        assert request.params.name == "execute_azure_cli_command"
+        assert request.params.arguments == {"command": "az --version"}
+
+    @pytest.mark.parametrize("mock_target,mock_return,command,expected", [
+        pytest.param(
+            "execute_azure_cli", _AZ_VERSION_OUTPUT,
+            "az --version", _AZ_VERSION_OUTPUT,
+            id="workflow",
+        ),
+        pytest.param(
+            None, None, "invalid command", _INVALID_COMMAND_ERROR,
+            id="invalid-command",
+        ),
+        pytest.param(
+            "_run_azure_cli_command", _LARGE_OUTPUT, "az --version", _LARGE_OUTPUT,
+            id="large-output",
+        ),
+        pytest.param(
+            "_run_azure_cli_command", _UNICODE_OUTPUT, "az --version", _UNICODE_OUTPUT,
+            id="unicode-output",
+        ),
+    ])
+    async def test_tool_call_matrix(
+        self, service, mock_target, mock_return, command, expected, monkeypatch
+    ):
+        """Test tool calls end to end through the MCP handler."""
+        monkeypatch.setattr(_main_mod, "azure_cli_service", service)
+
+        request = _mk_req(command=command)
+
+        if mock_target:
+            monkeypatch.setattr(service, mock_target, _const_coro(mock_return))
+
+        result = await handle_azure_cli_tool(request)
+
+        # Service errors are returned as text, not as MCP errors
+        assert not result.isError
+        assert len(result.content) == 1
+        assert isinstance(result.content[0], TextContent)
+        assert result.content[0].text == expected
+
+    async def test_end_to_end_azure_command_execution(self, service):
         """Test end-to-end Azure CLI command execution."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Mock the actual Azure CLI execution
-            with patch('asyncio.create_subprocess_shell') as mock_create:
-                mock_process = MagicMock()
-                mock_process.returncode = 0
-                mock_process.communicate = AsyncMock(return_value=(b"azure-cli 2.0.0", b""))
-                mock_create.return_value = mock_process
-                
-                result = await service.execute_azure_cli("az --version")
-                
-                assert "azure-cli 2.0.0" in result
-                mock_create.assert_called_once()
-
-    @pytest.mark.asyncio
-    async def test_login_flow_integration(self):
-        """Test complete login flow integration."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Mock the login process
-            with patch('asyncio.create_subprocess_shell') as mock_create:
-                mock_process = MagicMock()
-                mock_process.returncode = 0
-                mock_process.stdout = AsyncMock()
-                mock_process.stderr = AsyncMock()
-                mock_process.stdin = MagicMock()
-                mock_create.return_value = mock_process
-                
-                # Mock background processing
-                with patch.object(service.login_handler, '_handle_login_background') as mock_background:
-                    mock_background.return_value = "Login successful with device code ABC123"
-                    
-                    result = await service.execute_azure_cli("az login")
-                    
-                    assert "Login successful" in result
-                    assert "ABC123" in result
-
-    @pytest.mark.asyncio
-    async def test_service_principal_login_integration(self):
-        """Test service principal login integration."""
-        credentials_env = {
-            **self.test_env,
-            "AZURE_TENANT_ID": "test-tenant",
-            "AZURE_CLIENT_ID": "test-client",
-            "AZURE_CLIENT_SECRET": "test-secret"
-        }
-
-        with patch.dict(os.environ, credentials_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-
-            # Mock the login handler directly since authentication uses login commands
-            with patch.object(service.login_handler, 'handle_az_login_command') as mock_login:
-                mock_login.return_value = "Login successful"
-
-                # Get the credentials in the format expected by _authenticate
-                azure_creds = settings.get_azure_credentials_json()
-                result = await service._authenticate(azure_creds)
-
-                assert result == "Login successful"
-                mock_login.assert_called_once()
-                # Verify the login command contains the expected elements
-                call_args = mock_login.call_args[0][0]
-                assert "az login --service-principal" in call_args
-                assert "test-tenant" in call_args
-                assert "test-client" in call_args
-                assert "test-secret" in call_args
-
-    @pytest.mark.asyncio
-    async def test_error_handling_integration(self):
-        """Test error handling across the complete system."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            import azure_cli_mcp.main
-            azure_cli_mcp.main.azure_cli_service = service
-            
-            # Test with invalid command
-            request = CallToolRequest(
-                method="tools/call",
-                params=CallToolRequestParams(
-                    name="execute_azure_cli_command",
-                    arguments={"command": "invalid command"}
-                )
+        # Mock the actual Azure CLI execution
+        with patch('asyncio.create_subprocess_exec') as mock_create:
+            mock_process = SimpleNamespace(
+                returncode=0,
+                communicate=AsyncMock(return_value=(b"azure-cli 2.0.0", b"")),
             )
+            mock_create.return_value = mock_process
             
-            result = await handle_azure_cli_tool(request)
+            result = await service.execute_azure_cli("az --version")
             
-            assert not result.isError  # Service returns error message, not MCP error
-            assert "Invalid command" in result.content[0].text
+            assert "azure-cli 2.0.0" in result
+            mock_create.assert_called_once()
+
+    async def test_login_flow_integration(self, service, monkeypatch):
+        """Test complete login flow integration."""
+        # Mock background processing
+        mock_background = AsyncMock(
+            return_value="Login successful with device code ABC123"
+        )
+        monkeypatch.setattr(
+            service.login_handler, "_handle_login_background", mock_background
+        )
+
+        # Mock the login process
+        with patch('asyncio.create_subprocess_exec') as mock_create:
+            # Output handling is mocked above, so the process needs no pipes
+            mock_create.return_value = SimpleNamespace(returncode=0)
 
-    @pytest.mark.asyncio
-    async def test_concurrent_command_execution_integration(self):
+            result = await service.execute_azure_cli("az login")
+
+            assert "Login successful" in result
+            assert "ABC123" in result
+
+    async def test_service_principal_login_integration(
+        self, service, azure_creds_json, monkeypatch
+    ):
+        """Test service principal login integration."""
+        # Mock the login handler directly since authentication uses login commands
+        mock_login = AsyncMock(return_value="Login successful")
+        monkeypatch.setattr(
+            service.login_handler, "handle_az_login_command", mock_login
+        )
+
+        result = await service._authenticate(azure_creds_json)
+
+        assert result == "Login successful"
+        mock_login.assert_called_once()
+        # Verify the login command contains the expected elements
+        call_args = mock_login.call_args[0][0]
+        assert "az login --service-principal" in call_args
+        assert "test-tenant" in call_args
+        assert "test-client" in call_args
+        assert "test-secret" in call_args
+
+    async def test_concurrent_command_execution_integration(self, service, monkeypatch):
         """Test concurrent command execution integration."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            import azure_cli_mcp.main
-            azure_cli_mcp.main.azure_cli_service = service
-            
-            # Create multiple requests
-            requests = [
-                CallToolRequest(
-                    method="tools/call",
-                    params=CallToolRequestParams(
-                        name="execute_azure_cli_command",
-                        arguments={"command": f"az --version"}
-                    )
-                ) for i in range(3)
+        monkeypatch.setattr(_main_mod, "azure_cli_service", service)
+        
+        # Identical requests, so build the request once and reuse it
+        request = _mk_req(command="az --version")
+        
+        # Mock Azure CLI execution
+        monkeypatch.setattr(
+            service, "execute_azure_cli", _const_coro(_AZ_VERSION_OUTPUT)
+        )
+
+        # Execute requests concurrently
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(handle_azure_cli_tool(request)) for _ in range(3)
             ]
-            
-            # Mock Azure CLI execution
-            with patch.object(service, 'execute_azure_cli') as mock_execute:
-                mock_execute.return_value = "azure-cli 2.0.0"
-                
-                # Execute requests concurrently
-                results = await asyncio.gather(*[
-                    handle_azure_cli_tool(req) for req in requests
-                ])
-                
-                assert len(results) == 3
-                assert all(not result.isError for result in results)
-                assert all("azure-cli 2.0.0" in result.content[0].text for result in results)
-
-    @pytest.mark.asyncio
-    async def test_logging_integration(self):
+        results = [task.result() for task in tasks]
+
+        assert len(results) == 3
+        assert all(not result.isError for result in results)
+        assert all(
+            result.content[0].text == _AZ_VERSION_OUTPUT for result in results
+        )
+
+    async def test_logging_integration(self, monkeypatch, caplog):
         """Test logging integration across the system."""
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.log') as temp_log:
-            log_file = temp_log.name
-
-        try:
-            test_env = {
-                **self.test_env,
-                "LOG_FILE": log_file,
-                "LOG_LEVEL": "DEBUG"
-            }
-
-            with patch.dict(os.environ, test_env):
-                settings = Settings()
-                service = AzureCliService(settings)
-
-                # Mock command execution
-                with patch.object(service, '_run_azure_cli_command') as mock_run:
-                    mock_run.return_value = "Command output"
-
-                    result = await service.execute_azure_cli("az --version")
-
-                    assert "Command output" in result
-
-                    # Force flush of log handlers
-                    for handler in service.logger.handlers:
-                        if hasattr(handler, 'flush'):
-                            handler.flush()
-
-                    # Check that log file was created and contains entries
-                    if os.path.exists(log_file):
-                        with open(log_file, 'r') as f:
-                            log_content = f.read()
-                            # The log content may be empty due to buffering, so just check service was created
-                            assert len(log_content) >= 0  # File exists and is readable
-
-        finally:
-            # Clean up
-            try:
-                if os.path.exists(log_file):
-                    os.unlink(log_file)
-            except OSError:
-                pass
-
-    @pytest.mark.asyncio
-    async def test_configuration_integration(self):
+        monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+
+        settings = Settings()
+        service = AzureCliService(settings)
+
+        # Mock command execution
+        mock_run = AsyncMock(return_value="Command output")
+        monkeypatch.setattr(service, "_run_azure_cli_command", mock_run)
+
+        with caplog.at_level(logging.DEBUG, logger="azure_cli_mcp"):
+            result = await service.execute_azure_cli("az --version")
+
+        assert "Command output" in result
+        assert any("az --version" in r.message for r in caplog.records)
+
+    @pytest.mark.parametrize("env_service", [{
+        "LOG_LEVEL": "DEBUG",
+        "COMMAND_TIMEOUT": "60",
+        "MAX_CONCURRENT_COMMANDS": "10"
+    }], indirect=True)
+    async def test_configuration_integration(self, env_service):
         """Test configuration integration across components."""
-        custom_env = {
-            "LOG_LEVEL": "DEBUG",
-            "COMMAND_TIMEOUT": "60",
-            "MAX_CONCURRENT_COMMANDS": "10"
-        }
-        
-        with patch.dict(os.environ, custom_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Verify settings are properly integrated
-            assert service.settings.log_level == "DEBUG"
-            assert service.settings.command_timeout == 60
-            assert service.settings.max_concurrent_commands == 10
+        # Verify settings are properly integrated
+        assert env_service.settings.log_level == "DEBUG"
+        assert env_service.settings.command_timeout == 60
+        assert env_service.settings.max_concurrent_commands == 10
 
-    @pytest.mark.asyncio
-    async def test_mcp_tool_parameter_validation(self):
+    async def test_mcp_tool_parameter_validation(self, service, monkeypatch):
         """Test MCP tool parameter validation integration."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            import azure_cli_mcp.main
-            azure_cli_mcp.main.azure_cli_service = service
-            
-            # Test missing command parameter
-            request = CallToolRequest(
-                method="tools/call",
-                params=CallToolRequestParams(
-                    name="execute_azure_cli_command",
-                    arguments={}
-                )
-            )
-            
-            result = await handle_azure_cli_tool(request)
-            
-            assert result.isError
-            assert "Missing command argument" in result.content[0].text
-            
-            # Test invalid command type
-            request = CallToolRequest(
-                method="tools/call",
-                params=CallToolRequestParams(
-                    name="execute_azure_cli_command",
-                    arguments={"command": 123}
-                )
-            )
-            
-            result = await handle_azure_cli_tool(request)
-            
-            assert result.isError
-            assert "Command must be a string" in result.content[0].text
+        monkeypatch.setattr(_main_mod, "azure_cli_service", service)
+        
+        # Test missing command parameter
+        request = _mk_req()
+        
+        result = await handle_azure_cli_tool(request)
+        
+        assert result.isError
+        assert "Missing command argument" in result.content[0].text
+        
+        # Test invalid command type
+        request = _mk_req(command=123)
+        
+        result = await handle_azure_cli_tool(request)
+        
+        assert result.isError
+        assert "Command must be a string" in result.content[0].text
 
-    @pytest.mark.asyncio
-    async def test_system_resilience_integration(self):
+    async def test_system_resilience_integration(self, service, monkeypatch):
         """Test system resilience under various failure conditions."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            import azure_cli_mcp.main
-            azure_cli_mcp.main.azure_cli_service = service
-            
-            # Test with service failure
-            with patch.object(service, 'execute_azure_cli') as mock_execute:
-                mock_execute.side_effect = Exception("Service failure")
-                
-                request = CallToolRequest(
-                    method="tools/call",
-                    params=CallToolRequestParams(
-                        name="execute_azure_cli_command",
-                        arguments={"command": "az --version"}
-                    )
-                )
-                
-                result = await handle_azure_cli_tool(request)
-                
-                assert result.isError
-                assert "Service failure" in result.content[0].text
-
-    @pytest.mark.asyncio
-    async def test_memory_usage_integration(self):
-        """Test memory usage during command execution."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Mock large output
-            large_output = "x" * 10000
-            
-            with patch.object(service, '_run_azure_cli_command') as mock_run:
-                mock_run.return_value = large_output
-                
-                result = await service.execute_azure_cli("az --version")
-                
-                assert len(result) == 10000
-                assert result == large_output
-
-    @pytest.mark.asyncio
-    async def test_timeout_integration(self):
-        """Test timeout handling integration."""
-        timeout_env = {
-            **self.test_env,
-            "COMMAND_TIMEOUT": "1"  # 1 second timeout
-        }
+        monkeypatch.setattr(_main_mod, "azure_cli_service", service)
         
-        with patch.dict(os.environ, timeout_env):
-            settings = Settings()
-            service = AzureCliService(settings)
-            
-            # Mock long-running command
-            with patch('asyncio.create_subprocess_shell') as mock_create:
-                mock_create.side_effect = asyncio.TimeoutError("Command timeout")
-                
-                result = await service.execute_azure_cli("az long-running-command")
-                
-                assert "Command timed out" in result
-                assert result.startswith("Error:")
-
-    @pytest.mark.asyncio
-    async def test_unicode_handling_integration(self):
-        """Test Unicode character handling integration."""
-        with patch.dict(os.environ, self.test_env):
-            settings = Settings()
-            service = AzureCliService(settings)
+        # Test with service failure
+        mock_execute = AsyncMock(side_effect=Exception("Service failure"))
+        monkeypatch.setattr(service, "execute_azure_cli", mock_execute)
+
+        request = _mk_req(command="az --version")
+
+        result = await handle_azure_cli_tool(request)
+
+        assert result.isError
+        assert "Service failure" in result.content[0].text
+
+    @pytest.mark.parametrize("env_service", [{
+        "COMMAND_TIMEOUT": "1"  # 1 second timeout
+    }], indirect=True)
+    async def test_timeout_integration(self, env_service):
+        """Test timeout handling integration."""
+        # Mock long-running command
+        with patch('asyncio.create_subprocess_exec') as mock_create:
+            mock_create.side_effect = asyncio.TimeoutError("Command timeout")
             
-            # Test with Unicode characters
-            unicode_output = "Azure CLI with émojis: 🚀 and accénts"
+            result = await env_service.execute_azure_cli("az long-running-command")
             
-            with patch.object(service, '_run_azure_cli_command') as mock_run:
-                mock_run.return_value = unicode_output
-                
-                result = await service.execute_azure_cli("az --version")
-                
-                assert result == unicode_output
-                assert "🚀" in result
-                assert "émojis" in result
-                assert "accénts" in result 
\ No newline at end of file
+            assert "Command timed out" in result
+            assert result.startswith("Error:")
@@ -0,0 +1,21 @@
+"""Performance benchmarks for hot code paths.
+
+Regressions are caught by comparing runs, e.g. with
+``--benchmark-compare --benchmark-compare-fail=mean:10%``.
+"""
+
+import pytest
+
+from azure_cli_mcp.services.azure_cli_service import validate_command
+
+pytest.importorskip("pytest_benchmark")
+
+# Very long but valid command
+_LONG_PAYLOAD = "az --version " + "x" * 10_000
+
+
+def test_validate_command_throughput(benchmark):
+    """Benchmark validating a long command."""
+    result = benchmark(validate_command, _LONG_PAYLOAD)
+
+    assert result == _LONG_PAYLOAD